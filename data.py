@@ -1,5 +1,41 @@
-from sqlalchemy import create_engine, text
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import QueuePool
+
+# Applied to every new DBAPI connection handed out by the pool
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=1073741824",
+    # Queries never write, only _build_indexes() lifts this temporarily
+    "PRAGMA query_only=1",
+    "PRAGMA read_uncommitted=1",
+)
+
+# Rows buffered per round trip to the SQLite driver
+FETCH_BATCH_SIZE = 1000
+
+# Bump INDEX_VERSION when changing SQLITE_INDEXES so existing
+# databases get the new indexes on their next start.
+# Note that this, like journal_mode=WAL, writes to the database file:
+# the first start grows the bundled flights.sqlite3 by about 40 MB.
+INDEX_VERSION = 1
+SQLITE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_flights_ymd "
+    "ON flights(YEAR, MONTH, DAY)",
+    "CREATE INDEX IF NOT EXISTS ix_flights_origin_delay "
+    "ON flights(ORIGIN_AIRPORT, DEPARTURE_DELAY)",
+    "CREATE INDEX IF NOT EXISTS ix_flights_airline_delay "
+    "ON flights(airline, DEPARTURE_DELAY)",
+)
 
 QUERY_FLIGHT_BY_ID = """
     SELECT flights.*, 
@@ -24,35 +60,71 @@ AND flights.DAY = :day
 
 QUERY_DELAYED_FLIGHTS_BY_AIRLINE = """
 SELECT 
-    flights.*, 
-    airlines.airline, 
-    flights.ID as FLIGHT_ID, 
-    flights.DEPARTURE_DELAY as DELAY 
+    flights.ID AS FLIGHT_ID, 
+    flights.ORIGIN_AIRPORT, 
+    flights.DESTINATION_AIRPORT, 
+    flights.DEPARTURE_DELAY AS DELAY, 
+    airlines.airline AS AIRLINE 
 FROM flights 
 JOIN airlines ON flights.airline = airlines.id 
 WHERE airlines.airline = :airline 
-AND flights.DEPARTURE_DELAY > 0
+AND flights.DEPARTURE_DELAY > 0 
+ORDER BY flights.ID
 """
 QUERY_DELAYED_FLIGHTS_BY_AIRPORT = """
 SELECT 
-    flights.*, 
-    airlines.airline, 
-    flights.ID as FLIGHT_ID, 
-    flights.DEPARTURE_DELAY as DELAY 
+    flights.ID AS FLIGHT_ID, 
+    flights.ORIGIN_AIRPORT, 
+    flights.DESTINATION_AIRPORT, 
+    flights.DEPARTURE_DELAY AS DELAY, 
+    airlines.airline AS AIRLINE 
 FROM flights 
 JOIN airlines ON flights.airline = airlines.id 
 WHERE flights.ORIGIN_AIRPORT = :airport 
-AND flights.DEPARTURE_DELAY > 0
+AND flights.DEPARTURE_DELAY > 0 
+ORDER BY flights.ID
 """
 
-QUERY_ALL_FLIGHTS = """
+QUERY_DELAY_PCT_BY_AIRLINE = """
 SELECT 
-    flights.*, 
-    airlines.airline, 
-    flights.ID as FLIGHT_ID, 
-    flights.DEPARTURE_DELAY as DELAY 
+    flights.airline AS airline_id, 
+    SUM(CASE WHEN CAST(flights.DEPARTURE_DELAY AS INTEGER) > 0
+        THEN 1 ELSE 0 END) AS delayed, 
+    COUNT(*) AS total 
+FROM flights 
+GROUP BY flights.airline
+"""
+
+QUERY_AIRLINES = """
+SELECT 
+    id, 
+    airline 
+FROM airlines
+"""
+
+QUERY_HOURLY_DELAY = """
+SELECT 
+    CAST(substr(flights.DEPARTURE_TIME, 1, 2) AS INTEGER) AS hour, 
+    SUM(CASE WHEN CAST(flights.DEPARTURE_DELAY AS INTEGER) > 0
+        THEN 1 ELSE 0 END) AS delayed, 
+    COUNT(*) AS total 
 FROM flights 
-JOIN airlines ON flights.airline = airlines.id
+JOIN airlines ON flights.airline = airlines.id 
+WHERE flights.DEPARTURE_TIME != '' 
+GROUP BY hour 
+HAVING hour BETWEEN 0 AND 23
+"""
+
+QUERY_ROUTE_DELAY = """
+SELECT 
+    flights.ORIGIN_AIRPORT AS o, 
+    flights.DESTINATION_AIRPORT AS d, 
+    SUM(CASE WHEN CAST(flights.DEPARTURE_DELAY AS INTEGER) > 0
+        THEN 1 ELSE 0 END) AS delayed, 
+    COUNT(*) AS total 
+FROM flights 
+JOIN airlines ON flights.airline = airlines.id 
+GROUP BY o, d
 """
 
 QUERY_AIRPORTS = """
@@ -63,6 +135,13 @@ SELECT
 FROM airports
 """
 
+# Compiled once at import time so repeated calls reuse the same statement
+_STMT_FLIGHT_BY_ID = text(QUERY_FLIGHT_BY_ID)
+_STMT_FLIGHTS_BY_DATE = text(QUERY_FLIGHTS_BY_DATE)
+_STMT_DELAYED_FLIGHTS_BY_AIRLINE = text(QUERY_DELAYED_FLIGHTS_BY_AIRLINE)
+_STMT_DELAYED_FLIGHTS_BY_AIRPORT = text(QUERY_DELAYED_FLIGHTS_BY_AIRPORT)
+_STMT_AIRPORTS = text(QUERY_AIRPORTS)
+
 
 class FlightData:
     """
@@ -72,33 +151,193 @@ class FlightData:
 
     def __init__(self, db_uri):
         """
-        Initialize a new engine using the given database URI
+        Initialize a new engine using the given database URI.
+        Connections are pooled, so the SQLite page cache survives
+        between queries.
+        """
+        self._engine = create_engine(
+            db_uri,
+            poolclass=QueuePool,
+            pool_size=5,
+            max_overflow=10,
+            pool_pre_ping=False,
+            connect_args={"check_same_thread": False},
+        )
+
+        @event.listens_for(self._engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+            cursor.close()
+
+        self._build_indexes()
+
+        # Aggregated results, keyed by query name
+        self._cache = {}
+
+        # Long-lived read-only connection shared by all queries
+        self._conn = self._engine.connect().execution_options(
+            stream_results=True, max_row_buffer=FETCH_BATCH_SIZE)
+
+        # Plain sqlite3 connections for the large scans and aggregates,
+        # which skip SQLAlchemy's per-row overhead. Each thread gets its
+        # own, so concurrent queries really run in parallel.
+        self._local = threading.local()
+        self._raw_connections = []
+        self._raw_lock = threading.Lock()
+
+        # The airlines table is tiny, translating ids in Python
+        # saves joining it against every flight
+        self._airlines = dict(self._fetch_raw(QUERY_AIRLINES))
+
+    @property
+    def _raw(self):
+        """
+        The plain sqlite3 connection of the calling thread,
+        opened on first use.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self._engine.url.database,
+                                         check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.executescript(";".join(SQLITE_PRAGMAS))
+            self._local.connection = connection
+            with self._raw_lock:
+                self._raw_connections.append(connection)
+        return connection
+
+    def _close_raw(self):
+        """
+        Closes the plain sqlite3 connection of the calling thread,
+        if it has opened one.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            return
+        self._local.connection = None
+        with self._raw_lock:
+            self._raw_connections.remove(connection)
+        connection.close()
+
+    def _build_indexes(self):
+        """
+        Creates the indexes used by the flight queries and refreshes the
+        query planner statistics. This only runs once per database, the
+        applied INDEX_VERSION is stored in its user_version.
         """
-        self._engine = create_engine(db_uri)
+        try:
+            with self._engine.begin() as connection:
+                version = connection.exec_driver_sql(
+                    "PRAGMA user_version").scalar()
+                if version >= INDEX_VERSION:
+                    return
+                connection.exec_driver_sql("PRAGMA query_only=0")
+                try:
+                    for statement in SQLITE_INDEXES:
+                        connection.exec_driver_sql(statement)
+                    connection.exec_driver_sql("ANALYZE")
+                    connection.exec_driver_sql(
+                        f"PRAGMA user_version = {INDEX_VERSION}")
+                finally:
+                    connection.exec_driver_sql("PRAGMA query_only=1")
+        except SQLAlchemyError as e:
+            print(f"Error building indexes: {e}")
 
-    def _execute_query(self, query, params=None):
+    def _execute_query(self, stmt, params=None):
+        """
+        Execute a compiled SQL statement with the params provided in a
+        dictionary on the shared connection, and returns the cursor result.
         """
-        Execute an SQL query with the params provided in a dictionary,
-        and returns a list of records (dictionary-like objects).
+        return self._conn.execute(stmt, params or {})
+
+    def _fetch_records(self, stmt, params=None):
+        """
+        Execute a compiled SQL statement and returns a list of records
+        (dictionary-like RowMapping objects, no dict is built per row).
         If an exception was raised, print the error, and return an empty list.
         """
         try:
-            with self._engine.connect() as connection:
-                result = connection.execute(text(query), params or {})
-                # Use the keys from the result to construct dictionaries
-                keys = result.keys()
-                return [dict(zip(keys, row)) for row in result]
+            return self._execute_query(stmt, params).mappings().all()
         except SQLAlchemyError as e:
+            print(f"Error executing query: {e}")
+            self._conn.rollback()
+            return []
+
+    def _fetch_raw(self, query, params=None):
+        """
+        Execute an SQL query on the plain sqlite3 connection and returns
+        a list of sqlite3.Row records (accessible by name and position).
+        If an exception was raised, print the error, and return an empty list.
+        """
+        try:
+            return self._raw.execute(query, params or {}).fetchall()
+        except sqlite3.Error as e:
             print(f"Error executing query: {e}")
             return []
 
+    def _read_frame(self, query):
+        """
+        Execute an SQL query on the plain sqlite3 connection and returns
+        the result as a pandas DataFrame.
+        If an exception was raised, print the error, and return an
+        empty DataFrame.
+        """
+        try:
+            return pd.read_sql(query, self._raw)
+        except (sqlite3.Error, pd.errors.DatabaseError) as e:
+            print(f"Error executing query: {e}")
+            return pd.DataFrame()
+
+    def fetch_columns(self, query, columns, batch=65536):
+        """
+        Execute an SQL query on the plain sqlite3 connection and returns
+        the requested columns as a dictionary of NumPy arrays.
+        columns maps each column name to the dtype of its array.
+        If an exception was raised, including a value that does not fit
+        the dtype of its column (such as NULL for an integer column),
+        print the error, and return an empty dictionary.
+        """
+        try:
+            cursor = self._raw.execute(query)
+            names = [column[0] for column in cursor.description]
+            positions = {name: names.index(name) for name in columns}
+            chunks = {name: [] for name in columns}
+            while rows := cursor.fetchmany(batch):
+                for name, dtype in columns.items():
+                    index = positions[name]
+                    chunks[name].append(np.fromiter(
+                        (row[index] for row in rows),
+                        dtype=dtype, count=len(rows)))
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Error executing query: {e}")
+            return {}
+        return {name: np.concatenate(chunks[name]) if chunks[name]
+                else np.empty(0, dtype=dtype)
+                for name, dtype in columns.items()}
+
+    def _fetch_cached(self, name, query, fetch=None):
+        """
+        Returns the result of a parameterless SQL query, executing
+        it only the first time it is requested under the given name.
+        The query is run with fetch (default: _fetch_raw).
+        Failed queries are not cached.
+        """
+        if name not in self._cache:
+            records = (fetch or self._fetch_raw)(query)
+            if len(records) == 0:
+                return records
+            self._cache[name] = records
+        return self._cache[name]
+
     def get_flight_by_id(self, flight_id):
         """
         Searches for flight details using flight ID.
         If the flight was found, returns a list with a single record.
         """
         params = {'id': flight_id}
-        return self._execute_query(QUERY_FLIGHT_BY_ID, params)
+        return self._fetch_records(_STMT_FLIGHT_BY_ID, params)
 
     def get_flights_by_date(self, day, month, year):
         """
@@ -106,7 +345,7 @@ class FlightData:
         If flights are found, returns a list of records.
         """
         params = {'day': day, 'month': month, 'year': year}
-        return self._execute_query(QUERY_FLIGHTS_BY_DATE, params)
+        return self._fetch_records(_STMT_FLIGHTS_BY_DATE, params)
 
     def get_delayed_flights_by_airline(self, airline_name):
         """
@@ -114,7 +353,7 @@ class FlightData:
         If flights are found, returns a list of records.
         """
         params = {'airline': airline_name}
-        return self._execute_query(QUERY_DELAYED_FLIGHTS_BY_AIRLINE, params)
+        return self._fetch_records(_STMT_DELAYED_FLIGHTS_BY_AIRLINE, params)
 
     def get_delayed_flights_by_airport(self, airport_code):
         """
@@ -122,24 +361,144 @@ class FlightData:
         If flights are found, returns a list of records.
         """
         params = {'airport': airport_code}
-        return self._execute_query(QUERY_DELAYED_FLIGHTS_BY_AIRPORT, params)
+        return self._fetch_records(_STMT_DELAYED_FLIGHTS_BY_AIRPORT, params)
+
+    def get_delay_pct_by_airline(self):
+        """
+        Counts delayed and total flights per airline in the database.
+        Returns a dictionary of NumPy arrays with the keys
+        'airline', 'delayed' and 'total', one entry per airline,
+        ordered by airline name.
+        The result is cached, since the flight data does not change.
+        """
+        return self._fetch_cached('delay_pct_by_airline',
+                                  QUERY_DELAY_PCT_BY_AIRLINE,
+                                  self._fetch_airline_columns)
 
-    def get_all_flights(self):
+    def _fetch_airline_columns(self, query):
         """
-        Fetches all flight records.
+        Fetches the per airline id counts of the given query as NumPy
+        arrays and translates the ids to airline names.
+        Flights of unknown airlines are left out.
         """
-        return self._execute_query(QUERY_ALL_FLIGHTS)
+        columns = self.fetch_columns(query, {'airline_id': np.int64,
+                                             'delayed': np.int32,
+                                             'total': np.int32})
+        if not columns:
+            return columns
+        ids = columns['airline_id']
+        order = sorted((index for index, airline_id in enumerate(ids)
+                        if airline_id in self._airlines),
+                       key=lambda index: self._airlines[ids[index]])
+        names = np.array([self._airlines[ids[index]] for index in order],
+                         dtype=object)
+        return {'airline': names,
+                'delayed': columns['delayed'][order],
+                'total': columns['total'][order]}
+
+    def get_hourly_delay(self):
+        """
+        Counts delayed and total flights per departure hour (0-23).
+        Returns a dictionary of NumPy arrays with the keys
+        'hour', 'delayed' and 'total', one entry per hour.
+        The result is cached, since the flight data does not change.
+        """
+        columns = {'hour': np.int8, 'delayed': np.int32, 'total': np.int32}
+        return self._fetch_cached(
+            'hourly_delay', QUERY_HOURLY_DELAY,
+            lambda query: self.fetch_columns(query, columns))
+
+    def get_route_delay(self):
+        """
+        Counts delayed and total flights per route. Returns a DataFrame
+        with one row per route and the columns 'o' (origin airport),
+        'd' (destination airport), 'delayed', 'total' and 'pct'
+        (delayed share of the flights, 0-1).
+        The result is cached, since the flight data does not change,
+        so callers must not modify it in place.
+        """
+        return self._fetch_cached('route_delay', QUERY_ROUTE_DELAY,
+                                  self._read_route_frame)
+
+    def _read_route_frame(self, query):
+        """
+        Reads the routes of the given query into a DataFrame and adds
+        their delayed share, shared by the heatmap and the map plot.
+        """
+        routes = self._read_frame(query)
+        if routes.empty:
+            return routes
+        # Airport codes as categories and 32 bit counts keep the
+        # frame compact, the delayed share stays float64
+        routes = routes.astype({'o': 'category', 'd': 'category',
+                                'delayed': np.int32, 'total': np.int32})
+        routes['pct'] = routes['delayed'] / routes['total']
+        return routes
 
     def get_airports(self):
         """
         Fetches all airports with their IATA code,
         latitude, and longitude.
         """
-        return self._execute_query(QUERY_AIRPORTS)
+        return self._fetch_records(_STMT_AIRPORTS)
+
+    def prefetch_aggregates(self):
+        """
+        Runs the airline, hourly and route aggregates concurrently, each
+        on its own connection, and caches them for the plot getters.
+        The worker connections are closed once their aggregate is cached.
+        """
+        getters = (self.get_delay_pct_by_airline, self.get_hourly_delay,
+                   self.get_route_delay)
 
-    def __del__(self):
+        def run(getter):
+            try:
+                getter()
+            finally:
+                self._close_raw()
+
+        with ThreadPoolExecutor(max_workers=len(getters)) as executor:
+            for future in [executor.submit(run, getter) for getter in getters]:
+                future.result()
+
+    def refresh(self):
+        """
+        Clears the cached aggregates, so the next call of a cached
+        getter queries the database again.
+        """
+        self._cache.clear()
+
+    def get_airports_frame(self):
+        """
+        Fetches all airports with their IATA code, latitude, and
+        longitude into a pandas DataFrame indexed by IATA code.
+        If an exception was raised, print the error, and return an
+        empty DataFrame with the same index and columns.
         """
-        Closes the connection to the database when the
-        object is about to be destroyed
+        try:
+            return pd.read_sql(_STMT_AIRPORTS, self._conn,
+                               index_col='IATA_CODE')
+        except (SQLAlchemyError, pd.errors.DatabaseError) as e:
+            print(f"Error executing query: {e}")
+            self._conn.rollback()
+            return pd.DataFrame(columns=['LATITUDE', 'LONGITUDE'],
+                                index=pd.Index([], name='IATA_CODE'))
+
+    def close(self):
         """
+        Closes the shared connections and all pooled connections
+        to the database. Calling it more than once is harmless.
+        """
+        with self._raw_lock:
+            for connection in self._raw_connections:
+                connection.close()
+            self._raw_connections.clear()
+        self._local = threading.local()
+        self._conn.close()
         self._engine.dispose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,5 +1,13 @@
+import argparse
+import atexit
 import data
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from operator import itemgetter
+import matplotlib
 import pandas as pd
 from plotting import (
     plot_delayed_flights_by_airline, plot_delayed_flights_by_hour,
@@ -8,6 +16,10 @@ from plotting import (
 
 SQLITE_URI = 'sqlite:///flights.sqlite3'
 IATA_LENGTH = 3
+DATE_RE = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})$')
+PRINT_CHUNK_SIZE = 8192
+RESULT_FIELDS = itemgetter('DELAY', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT',
+                           'AIRLINE', 'FLIGHT_ID')
 
 
 def get_airports_data(data_manager):
@@ -15,25 +27,12 @@ def get_airports_data(data_manager):
     Fetches airport data from the database and returns it as a pandas DataFrame.
     Handles empty values in LATITUDE and LONGITUDE.
     """
-    airport_records = data_manager.get_airports()
-    data = {
-        'IATA_CODE': [record['IATA_CODE'] for record in airport_records],
-        'latitude': [
-            float(record['LATITUDE']) if record['LATITUDE'] else None
-            for record in airport_records
-        ],
-        'longitude': [
-            float(record['LONGITUDE']) if record['LONGITUDE'] else None
-            for record in airport_records
-        ]
-    }
-    # Filter out records with None values for latitude or longitude
-    valid_data = {key: [] for key in data}
-    for i in range(len(data['IATA_CODE'])):
-        if data['latitude'][i] is not None and data['longitude'][i] is not None:
-            for key in data:
-                valid_data[key].append(data[key][i])
-    return pd.DataFrame(valid_data).set_index('IATA_CODE')
+    airports = data_manager.get_airports_frame()
+    airports.columns = airports.columns.str.lower()
+    coords = ['latitude', 'longitude']
+    airports[coords] = airports[coords].apply(pd.to_numeric, errors='coerce')
+    # Drop airports with missing latitude or longitude
+    return airports.dropna(subset=coords)
 
 
 def delayed_flights_by_airline(data_manager):
@@ -94,7 +93,11 @@ def flights_by_date(data_manager):
     while not valid:
         try:
             date_input = input("Enter date in DD/MM/YYYY format: ")
-            date = datetime.strptime(date_input, '%d/%m/%Y')
+            match = DATE_RE.match(date_input)
+            if not match:
+                raise ValueError(f"'{date_input}' does not match format DD/MM/YYYY")
+            day, month, year = map(int, match.groups())
+            date = datetime(year, month, day)
         except ValueError as e:
             print("Try again...", e)
         else:
@@ -108,24 +111,63 @@ def flights_by_date(data_manager):
         print("An unexpected error occurred.", e)
 
 
+def format_result(result):
+    """
+    Formats a single flight record as one line of output.
+    """
+    delay, origin, dest, airline, flight_id = RESULT_FIELDS(result)
+    delay = int(delay) if delay else 0
+    if delay > 0:
+        return f"{flight_id}. {origin} -> {dest} by {airline}, Delay: {delay} Minutes"
+    return f"{flight_id}. {origin} -> {dest} by {airline}"
+
+
+def write_lines(lines):
+    """
+    Writes the given lines to stdout with a single write call.
+    """
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
+
+
 def print_results(results):
     """
     Prints the results of flight queries.
+    Lines are written in chunks instead of one print call per flight.
     """
     print(f"Got {len(results)} results.")
+    lines = []
     for result in results:
         try:
-            delay = int(result['DELAY']) if result['DELAY'] else 0
-            origin = result['ORIGIN_AIRPORT']
-            dest = result['DESTINATION_AIRPORT']
-            airline = result['AIRLINE']
+            lines.append(format_result(result))
         except (ValueError, KeyError) as e:
+            write_lines(lines)
             print("Error showing results: ", e)
             return
-        if delay and delay > 0:
-            print(f"{result['FLIGHT_ID']}. {origin} -> {dest} by {airline}, Delay: {delay} Minutes")
-        else:
-            print(f"{result['FLIGHT_ID']}. {origin} -> {dest} by {airline}")
+        if len(lines) == PRINT_CHUNK_SIZE:
+            write_lines(lines)
+            lines = []
+    write_lines(lines)
+
+
+def plot_all(data_manager, output_dir=None):
+    """
+    Computes all plot aggregates concurrently, then shows every plot,
+    or saves them to output_dir if given.
+    The map is written in a worker thread while the matplotlib plots,
+    which must stay on the main thread, are rendered.
+    """
+    data_manager.prefetch_aggregates()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        map_future = executor.submit(plot_delayed_flights_map,
+                                     data_manager.get_route_delay(), airports,
+                                     output_dir=output_dir)
+        plot_delayed_flights_by_airline(data_manager.get_delay_pct_by_airline(),
+                                        output_dir)
+        plot_delayed_flights_by_hour(data_manager.get_hourly_delay(),
+                                     output_dir)
+        plot_heatmap_routes(data_manager.get_route_delay(), output_dir)
+        map_future.result()
 
 
 def show_menu_and_get_input():
@@ -151,33 +193,59 @@ FUNCTIONS = {
     2: (flights_by_date, "Show flights by date"),
     3: (delayed_flights_by_airline, "Delayed flights by airline"),
     4: (delayed_flights_by_airport, "Delayed flights by origin airport"),
-    5: (lambda data_manager: plot_delayed_flights_by_airline(data_manager.get_all_flights()),
+    5: (lambda data_manager: plot_delayed_flights_by_airline(
+            data_manager.get_delay_pct_by_airline()),
         "Plot delayed flights by airline"),
-    6: (lambda data_manager: plot_delayed_flights_by_hour(data_manager.get_all_flights()),
+    6: (lambda data_manager: plot_delayed_flights_by_hour(
+            data_manager.get_hourly_delay()),
         "Plot delayed flights by hour"),
-    7: (lambda data_manager: plot_heatmap_routes(data_manager.get_all_flights()),
+    7: (lambda data_manager: plot_heatmap_routes(
+            data_manager.get_route_delay()),
         "Plot heatmap of delayed flights by route"),
-    8: (lambda data_manager: plot_delayed_flights_map(data_manager.get_all_flights(), airports),
+    8: (lambda data_manager: plot_delayed_flights_map(
+            data_manager.get_route_delay(), airports),
         "Plot map of delayed flights by route"),
-    9: (quit, "Exit")
+    9: (plot_all, "Plot all of the above"),
+    10: (quit, "Exit")
 }
 
 
+def parse_args():
+    """
+    Parses the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Explore delayed flights.")
+    parser.add_argument(
+        '--output-dir',
+        help="render all plots into this directory without a GUI, then exit")
+    return parser.parse_args()
+
+
 def main():
     """
     Main function to run the application.
     """
-    data_manager = data.FlightData(SQLITE_URI)
-    global airports
-    airports = get_airports_data(data_manager)
-    while True:
-        choice_func = show_menu_and_get_input()
-        try:
-            choice_func(data_manager)
-        except AttributeError as e:
-            print(f"Error: {e}. Please check if the function is implemented.")
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+    args = parse_args()
+    if args.output_dir:
+        # Headless batch rendering, no GUI backend needed
+        matplotlib.use('Agg')
+    with data.FlightData(SQLITE_URI) as data_manager:
+        # Fallback in case the interpreter exits without unwinding
+        atexit.register(data_manager.close)
+        global airports
+        airports = get_airports_data(data_manager)
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            plot_all(data_manager, args.output_dir)
+            return
+        while True:
+            choice_func = show_menu_and_get_input()
+            try:
+                choice_func(data_manager)
+            except AttributeError as e:
+                print(f"Error: {e}. Please check if the function is implemented.")
+            except Exception as e:
+                print(f"An unexpected error occurred: {e}")
 
 
 if __name__ == "__main__":
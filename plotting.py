@@ -1,150 +1,142 @@
+import os
+
 import matplotlib.pyplot as plt
-import seaborn as sns
 import folium
 import pandas as pd
 import numpy as np
 
 
-def plot_delayed_flights_by_airline(results):
+def as_columnar(results):
     """
-    Plots the percentage of delayed flights by airline.
+    Converts query results (a list of records or a dictionary of
+    arrays) into a columnar pandas DataFrame.
+    DataFrames are returned unchanged.
     """
-    airline_delays = {}
+    if isinstance(results, pd.DataFrame):
+        return results
+    return pd.DataFrame(results)
+
 
-    for result in results:
-        airline = result['AIRLINE']
-        delay = int(result['DELAY']) if result['DELAY'] else 0
-        if airline not in airline_delays:
-            airline_delays[airline] = {'total': 0, 'delayed': 0}
-        airline_delays[airline]['total'] += 1
-        if delay > 0:
-            airline_delays[airline]['delayed'] += 1
+def show_or_save(name, output_dir=None):
+    """
+    Shows the current figure, or saves it as <output_dir>/<name>.png
+    when an output directory is given. The figure is closed afterwards
+    to release its memory.
+    """
+    if output_dir is None:
+        plt.show()
+    else:
+        plt.savefig(os.path.join(output_dir, f'{name}.png'),
+                    dpi=150, bbox_inches='tight')
+    plt.close()
 
-    airlines = list(airline_delays.keys())
-    percentages = [airline_delays[airline]['delayed'] /
-                   airline_delays[airline]['total'] * 100 for airline in airlines]
+
+def plot_delayed_flights_by_airline(results, output_dir=None):
+    """
+    Plots the percentage of delayed flights by airline.
+    Expects the airlines with their 'delayed' and 'total' flight
+    counts, as returned by get_delay_pct_by_airline().
+    The plot is shown, or saved to output_dir if given.
+    """
+    results = as_columnar(results)
+    airlines = results['airline']
+    percentages = results['delayed'] / results['total'] * 100
 
     plt.figure(figsize=(12, 8))
-    sns.barplot(x=airlines, y=percentages)
-    plt.xticks(rotation=45, ha='right')
+    positions = np.arange(len(airlines))
+    plt.bar(positions, percentages)
+    plt.xticks(positions, airlines, rotation=45, ha='right')
     plt.xlabel('Airline')
     plt.ylabel('Percentage of Delayed Flights')
     plt.title('Percentage of Delayed Flights by Airline')
     plt.tight_layout()
-    plt.show()
+    show_or_save('delayed_flights_by_airline', output_dir)
 
 
-def plot_delayed_flights_by_hour(results):
+def plot_delayed_flights_by_hour(results, output_dir=None):
     """
     Plots the percentage of delayed flights by hour of the
     day using an enhanced bar plot.
+    Expects the hours with their 'delayed' and 'total' flight
+    counts, as returned by get_hourly_delay().
+    The plot is shown, or saved to output_dir if given.
     """
-    hour_delays = {hour: {'total': 0, 'delayed': 0}
-                   for hour in range(24)}
-
-    for result in results:
-        departure_time = result['DEPARTURE_TIME']
-        delay = int(result['DELAY']) if result['DELAY'] else 0
-
-        # Handle empty or malformed departure times
-        try:
-            hour = int(departure_time[:2])
-            if hour < 0 or hour > 23:
-                continue  # Skip invalid hour values
-        except (ValueError, TypeError):
-            continue
-
-        hour_delays[hour]['total'] += 1
-        if delay > 0:
-            hour_delays[hour]['delayed'] += 1
-
+    results = as_columnar(results)
     hours = np.arange(24)
-    percentages = [
-        hour_delays[hour]['delayed'] / hour_delays[hour]['total']
-        * 100 if hour_delays[hour]['total'] > 0 else 0 for
-        hour in hours]
+    # Scatter the counts into 24 slots, hours without flights stay 0
+    totals = np.bincount(results['hour'], weights=results['total'],
+                         minlength=24)
+    delayed = np.bincount(results['hour'], weights=results['delayed'],
+                          minlength=24)
+    percentages = np.divide(delayed * 100, totals,
+                            out=np.zeros(24), where=totals > 0)
 
     # Create an enhanced bar plot
     plt.figure(figsize=(12, 8))
-    palette = sns.color_palette("coolwarm", as_cmap=True)
-    colors = palette(np.linspace(0, 1, len(hours))).tolist()
+    cmap = plt.get_cmap('coolwarm')
+    norm = plt.Normalize(0, 23)
+    colors = cmap(norm(hours))
 
-    bar_plot = sns.barplot(x=hours, y=percentages, hue=hours,
-                           palette=colors, dodge=False, legend=False)
+    plt.bar(hours, percentages, color=colors)
+    plt.xticks(hours)
     plt.xlabel('Hour of Day')
     plt.ylabel('Percentage of Delayed Flights')
     plt.title('Percentage of Delayed Flights by Hour of Day')
 
     # Create a color bar
-    norm = plt.Normalize(0, 23)
-    sm = plt.cm.ScalarMappable(cmap=palette, norm=norm)
+    sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
     sm.set_array([])
     plt.colorbar(sm, ticks=np.arange(0, 24, 1),
-                 label='Hour of Day', ax=bar_plot.axes)
+                 label='Hour of Day', ax=plt.gca())
 
     plt.tight_layout()
-    plt.show()
+    show_or_save('delayed_flights_by_hour', output_dir)
 
 
-def plot_heatmap_routes(results):
+def plot_heatmap_routes(results, output_dir=None):
     """
     Plots a heatmap of the percentage of delayed flights
     by route (origin to destination).
+    Expects a DataFrame of routes with their delayed share 'pct',
+    as returned by get_route_delay().
+    The plot is shown, or saved to output_dir if given.
     """
-    route_delays = {}
-
-    for result in results:
-        origin = result['ORIGIN_AIRPORT']
-        destination = result['DESTINATION_AIRPORT']
-        delay = int(result['DELAY']) if result['DELAY'] else 0
-        route = (origin, destination)
-        if route not in route_delays:
-            route_delays[route] = {'total': 0, 'delayed': 0}
-        route_delays[route]['total'] += 1
-        if delay > 0:
-            route_delays[route]['delayed'] += 1
-
-    routes = list(route_delays.keys())
-    data = {
-        'Origin': [route[0] for route in routes],
-        'Destination': [route[1] for route in routes],
-        'Percentage Delayed': [route_delays[route]['delayed'] /
-                               route_delays[route]['total']
-                               * 100 for route in routes]
-    }
-
-    # Create a pivot table to format data for heatmap
-    df = pd.DataFrame(data)
-    pivot_table = df.pivot_table(values='Percentage Delayed',
-                                 index='Origin', columns='Destination')
+    results = as_columnar(results)
+    # Scatter the aggregated routes into an origin x destination matrix
+    # using the integer codes of the airport categories
+    origins = pd.Categorical(results['o'])
+    destinations = pd.Categorical(results['d'])
+    matrix = np.full((len(origins.categories), len(destinations.categories)),
+                     np.nan)
+    matrix[origins.codes, destinations.codes] = results['pct'].to_numpy() * 100
 
     plt.figure(figsize=(16, 12))
-    sns.heatmap(pivot_table, cmap='Reds', annot=False)
+    # One image instead of a mesh cell per route, NaN cells stay blank
+    ax = plt.gca()
+    image = ax.imshow(matrix, cmap='Reds', aspect='auto')
+    ax.set_xticks(range(len(destinations.categories)))
+    ax.set_xticklabels(destinations.categories, rotation=90)
+    ax.set_yticks(range(len(origins.categories)))
+    ax.set_yticklabels(origins.categories)
+    plt.colorbar(image)
     plt.xlabel('Destination Airport')
     plt.ylabel('Origin Airport')
     plt.title('Percentage of Delayed Flights by Route')
     plt.tight_layout()
-    plt.show()
+    show_or_save('heatmap_routes', output_dir)
 
 
-def plot_delayed_flights_map(results, airports):
+def plot_delayed_flights_map(results, airports, min_flights=5,
+                             output_dir=None):
     """
     Plots an interactive map of the percentage of delayed flights by route (origin to destination)
     focusing on the United States using Folium.
+    Expects a DataFrame of routes with their delayed share 'pct',
+    as returned by get_route_delay().
+    Routes with fewer than min_flights flights are not drawn.
+    The map is saved as delayed_flights_map.html, in output_dir if given.
     """
-    route_delays = {}
-
-    for result in results:
-        origin = result['ORIGIN_AIRPORT']
-        destination = result['DESTINATION_AIRPORT']
-        delay = int(result['DELAY']) if result['DELAY'] else 0
-        route = (origin, destination)
-        if route not in route_delays:
-            route_delays[route] = {'total': 0, 'delayed': 0}
-        route_delays[route]['total'] += 1
-        if delay > 0:
-            route_delays[route]['delayed'] += 1
-
+    results = as_columnar(results)
     map_center = [37.0902, -95.7129]  # Center of the United States
     flight_map = folium.Map(location=map_center, zoom_start=4)
 
@@ -154,42 +146,50 @@ def plot_delayed_flights_map(results, airports):
         'High Delay': folium.FeatureGroup(name='High Delay (>40%)')
     }
 
-    def get_delay_color(delay_percentage):
+    # Delay buckets split at 20% and 40%, colored
+    # green for low, yellow for medium and red for high delay
+    delay_thresholds = [0.2, 0.4]
+    bucket_colors = ['green', 'yellow', 'red']
+
+    # Gather the coordinates of both endpoints with two vectorized
+    # reindexes, dropping routes with an unknown airport
+    coords = ['latitude', 'longitude']
+    origins = airports.reindex(results['o'].to_numpy())[coords].to_numpy()
+    destinations = airports.reindex(results['d'].to_numpy())[coords].to_numpy()
+    valid = ~(np.isnan(origins).any(axis=1) | np.isnan(destinations).any(axis=1))
+
+    # Skip rarely flown routes, their delay share is mostly noise
+    valid &= results['total'].to_numpy() >= min_flights
+    buckets = np.digitize(results['pct'].to_numpy()[valid],
+                          delay_thresholds).tolist()
+    # GeoJSON expects [longitude, latitude] pairs
+    origins = origins[valid][:, ::-1].tolist()
+    destinations = destinations[valid][:, ::-1].tolist()
+
+    def route_style(feature):
         """
-        Maps delay percentage to a color.
-        - Green for low delay
-        - Yellow for medium delay
-        - Red for high delay
+        Styles a route line with the color stored on its feature.
         """
-        if delay_percentage < 0.2:
-            return 'green'
-        elif delay_percentage < 0.4:
-            return 'yellow'
-        else:
-            return 'red'
-
-    for route, counts in route_delays.items():
-        origin, destination = route
-        if origin in airports.index and destination in airports.index:
-            origin_coords = [airports.loc[origin]['latitude'],
-                             airports.loc[origin]['longitude']]
-            destination_coords = [airports.loc[destination]['latitude'],
-                                  airports.loc[destination]['longitude']]
-            delay_percentage = counts['delayed'] / counts['total']
-            color = get_delay_color(delay_percentage)
-
-            if delay_percentage < 0.2:
-                group = delay_groups['Low Delay']
-            elif delay_percentage < 0.4:
-                group = delay_groups['Medium Delay']
-            else:
-                group = delay_groups['High Delay']
-
-            folium.PolyLine(
-                locations=[origin_coords, destination_coords],
-                color=color,
-                weight=2,
-                opacity=0.6
+        return {'color': feature['properties']['color'],
+                'weight': 2, 'opacity': 0.6}
+
+    # Collect the routes as GeoJSON lines, one collection per delay group
+    features = [[] for _ in bucket_colors]
+    for bucket, origin, destination in zip(buckets, origins, destinations):
+        features[bucket].append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'LineString',
+                'coordinates': [origin, destination]
+            },
+            'properties': {'color': bucket_colors[bucket]}
+        })
+
+    for group, bucket_features in zip(delay_groups.values(), features):
+        if bucket_features:
+            folium.GeoJson(
+                {'type': 'FeatureCollection', 'features': bucket_features},
+                style_function=route_style
             ).add_to(group)
 
     for group in delay_groups.values():
@@ -198,5 +198,5 @@ def plot_delayed_flights_map(results, airports):
     folium.LayerControl().add_to(flight_map)
 
     # Save the map as an HTML file
-    flight_map.save('delayed_flights_map.html')
+    flight_map.save(os.path.join(output_dir or '', 'delayed_flights_map.html'))
 